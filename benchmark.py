@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import argparse
+import subprocess
+import tracemalloc
+from time import perf_counter
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import Workbook
+
+from src import (program_code, generate_report, update_report, ReportMetrics, extract_excel, extract_excel_stream, 
+                 _detail_frame, to_baht, category_columns)
+
+detail_header = ['วิทยาเขต',
+                 'คณะ',
+                 'รหัสหลักสูตร',
+                 'เลขทะเบียน',
+                 'เลขที่ใบเสร็จ',
+                 'ชื่อ นามสกุล',
+                 'ปีการศึกษา',
+                 'ภาค',
+                 'รายได้คณะ',
+                 'กองทุนคณะ',
+                 'รายได้คณะ',
+                 'กองทุนคณะ',
+                 'รายได้คณะ',
+                 'รวม']
+
+# program code -> (campus, faculty) of the synthetic students
+programs = {program_code['DSI']: ('รังสิต', 'วิทยาลัยนวัตกรรมดิจิทัลเทคโนโลยี'),
+            12240500101: ('รังสิต', 'วิทยาศาสตร์และเทคโนโลยี'),
+            12240500112: ('รังสิต', 'วิทยาศาสตร์และเทคโนโลยี'),
+            12240500133: ('ท่าพระจันทร์', 'พาณิชยศาสตร์และการบัญชี'),
+            12240500145: ('ลำปาง', 'ศิลปศาสตร์')}
+other_codes = [code for code in programs if code != program_code['DSI']]
+# (academic year, term, weight), most payments are for the current term
+academic_terms = [(2566, 1, 0.8), (2565, 2, 0.1), (2565, 3, 0.1)]
+first_names = ['สมชาย', 'สมหญิง', 'ณัฐพล', 'กมลชนก', 'ธนกฤต', 'พิมพ์ชนก', 'ปิยะพงษ์', 'วรรณิศา']
+last_names = ['ใจดี', 'รักเรียน', 'ทองคำ', 'ศรีสุข', 'บุญมา', 'แก้วประเสริฐ']
+
+def detail_rows(n_rows, prog_share=0.1, seed=0, date=datetime(2023, 8, 1)):
+    rng = random.Random(seed)
+    for i in range(n_rows):
+        is_prog = rng.random() < prog_share
+        code = program_code['DSI'] if is_prog else rng.choice(other_codes)
+        campus, faculty = programs[code]
+        year, term = rng.choices([t[:2] for t in academic_terms], [t[2] for t in academic_terms])[0]
+        cohort = rng.choice([year - 2500 - k for k in range(4)])
+        fees = [rng.choice([0, 1000, 2500, 4000]) for _ in range(4)] + [rng.choice([0, 1250.5, 3000])]
+        yield [campus,
+               faculty,
+               code,
+               f' {cohort}09{rng.randrange(100000):06d}',
+               f'{date:%y%m%d}{i:07d}',
+               f'{rng.choice(first_names)} {rng.choice(last_names)}',
+               year,
+               term,
+               *fees,
+               sum(fees)]
+
+def write_detail_excel(path, n_rows, prog_share=0.1, seed=0, date=datetime(2023, 8, 1)):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Detail")
+    ws.append(['รายงานรายละเอียดการรับชำระเงิน'])
+    ws.append(detail_header)
+    for row in detail_rows(n_rows, prog_share, seed, date):
+        ws.append(row)
+    wb.save(path)
+
+def write_month(directory, n_rows, n_files, year=2023, month=8, prog_share=0.1, seed=0):
+    # n_rows spread over one daily download per day, named like the real ones
+    paths = []
+    for day in range(1, n_files + 1):
+        date = datetime(year, month, day)
+        path = os.path.join(directory, f'income_{date:%Y%m%d}.xlsx')
+        rows = n_rows // n_files + (day <= n_rows % n_files)
+        write_detail_excel(path, rows, prog_share, seed + day, date)
+        paths.append(path)
+    return paths
+
+def detail_frame(n_rows, seed=0):
+    # the Detail sheet as returned by pd.read_excel, with duplicated names mangled
+    columns = detail_header[:9] + ['กองทุนคณะ', 'รายได้คณะ.1', 'กองทุนคณะ.1', 'รายได้คณะ.2', 'รวม']
+    return pd.DataFrame(detail_rows(n_rows, prog_share=1.0, seed=seed), columns=columns)
+
+def legacy_detail_frame(df):
+    # extract_excel before vectorization, kept as the reference output
+    cols = ["รายได้คณะ", "กองทุนคณะ.1", "รายได้คณะ.2", "รวม"]
+    df = df.copy()
+    df[cols] = df[cols].astype('float64')
+    df = df.assign(dep_income=df['รายได้คณะ'] + df['กองทุนคณะ.1'] + df['รายได้คณะ.2'])
+    df_filtered = df[['วิทยาเขต', 'คณะ', 'เลขทะเบียน', 'เลขที่ใบเสร็จ', 'ชื่อ นามสกุล', 'ปีการศึกษา', 'ภาค',
+                      'รายได้คณะ', 'กองทุนคณะ.1', 'รายได้คณะ.2', 'dep_income', 'รวม']].copy()
+    df_filtered['รหัส'] = df_filtered.apply(lambda row: row['เลขทะเบียน'].strip()[:2], axis = 1)
+    return df_filtered.set_index(['ปีการศึกษา', 'ภาค', 'รหัส'])
+
+def bench_vectorized(n_rows):
+    df = detail_frame(n_rows)
+    expected, legacy_time, legacy_peak = measure(legacy_detail_frame, df)
+    result, elapsed, peak = measure(_detail_frame, df)
+    # compare in the legacy representation: float baht and plain strings, in whatever string 
+    # dtype the installed pandas gives the legacy frame (object before 3.0, str after)
+    result = to_baht(result).astype({c: expected[c].dtype for c in category_columns})
+    pd.testing.assert_frame_equal(result, expected)
+    print(f'{"apply":>12} rows={n_rows:>8} time={legacy_time:8.3f}s peak={legacy_peak / 2**20:8.1f}MB')
+    print(f'{"vectorized":>12} rows={n_rows:>8} time={elapsed:8.3f}s peak={peak / 2**20:8.1f}MB')
+
+def bench_memory(n_rows, n_files):
+    # memory held by a month of daily frames, as generate_report keeps them in dfs
+    df = detail_frame(n_rows)
+    days = [df.iloc[i::n_files] for i in range(n_files)]
+    for name, func in [('float', legacy_detail_frame), ('compact', _detail_frame)]:
+        dfs = [func(day) for day in days]
+        size = sum(d.memory_usage(deep=True).sum() + d.index.memory_usage(deep=True) for d in dfs)
+        print(f'{name:>12} rows={n_rows:>8} files={n_files:>3} frames={size / 2**20:8.1f}MB')
+
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    start = perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def bench_readers(n_rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'income_20230801.xlsx')
+        write_detail_excel(path, n_rows)
+        for name, func in [('read_excel', extract_excel), ('stream', extract_excel_stream)]:
+            df, elapsed, peak = measure(func, path, program_code['DSI'])
+            print(f'{name:>12} rows={n_rows:>8} kept={len(df):>7} '
+                  f'time={elapsed:8.3f}s peak={peak / 2**20:8.1f}MB')
+
+def bench_report(n_rows, n_files, writer='reference', streaming=False):
+    # end-to-end generate_report, split into the stages recorded by ReportMetrics. times come 
+    # from an untraced run, peak memory from a second run under tracemalloc
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_month(tmp, n_rows, n_files)
+        output_path = os.path.join(tmp, 'report.xlsx')
+        runs = {}
+        for trace_memory in [False, True]:
+            metrics = ReportMetrics(trace_memory=trace_memory)
+            start = perf_counter()
+            generate_report(paths, output_path, n_workers=1, streaming=streaming, writer=writer, 
+                            sidecar=False, metrics=metrics)
+            runs[trace_memory] = perf_counter() - start, metrics.totals()
+    elapsed, stages = runs[False]
+    peaks = runs[True][1]
+    # times stay those of the untraced run
+    for name, total in stages.items():
+        total['peak_mb'] = peaks[name]['peak_mb']
+    peak = max(total['peak_mb'] for total in stages.values())
+
+    result = {'rows': n_rows, 'files': n_files, 'writer': writer, 'streaming': streaming, 
+              'time': elapsed, 'peak_mb': peak, 'stages': stages}
+    print(f'{"report":>12} rows={n_rows:>8} files={n_files:>3} time={elapsed:8.3f}s peak={peak:8.1f}MB ' 
+          + ' '.join(f'{k}={v["time"]:.3f}s' for k, v in stages.items()))
+    return result
+
+def bench_duplicates(n_rows, n_files):
+    # a month where the first day was downloaded twice, checked in every duplicates mode
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_month(tmp, n_rows, n_files)
+        repeated = os.path.join(tmp, f'income_202308{n_files + 1:02d}.xlsx')
+        shutil.copy(paths[0], repeated)
+        output_path = os.path.join(tmp, 'report.xlsx')
+        rows = {}
+        for mode in ['drop', 'flag', 'ignore']:
+            warns = []
+            dfs = generate_report(paths + [repeated], output_path, n_workers=1, sidecar=False, 
+                                  duplicates=mode, warn=warns.append)
+            rows[mode] = sum(len(df) for df in dfs)
+            print(f'{mode:>12} rows={rows[mode]:>8} warnings={len(warns)}')
+        # the repeated file appended to a report built without it is checked the same way
+        warns = []
+        generate_report(paths, output_path, n_workers=1)
+        flagged = update_report(output_path, repeated, duplicates='flag', warn=warns.append)
+        print(f'{"update":>12} rows={len(flagged):>8} warnings={len(warns)}')
+    # the repeated file adds no rows when dropped, all of them otherwise
+    assert rows['flag'] == rows['ignore'] == rows['drop'] + len(dfs[-1])
+    assert len(flagged) == len(dfs[-1]) and len(warns) == 1
+
+def import_time(module):
+    # import a module in a fresh interpreter, as the EXE does at startup
+    code = ("import sys, json; from time import perf_counter; start = perf_counter(); "
+            f"import {module}; elapsed = perf_counter() - start; "
+            "print(json.dumps({'time': elapsed, 'modules': [m for m in ('tkinter', 'pandas', 'openpyxl', 'src') if m in sys.modules]}))")
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True, 
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return json.loads(output)
+
+def bench_startup(budget, repeat=5):
+    # the GUI must not load the report engine before its window is shown, and the 
+    # headless engine must not load tkinter
+    ok = True
+    for module, unwanted in [('main', ['pandas', 'openpyxl', 'src']), ('src', ['tkinter'])]:
+        runs = [import_time(module) for _ in range(repeat)]
+        elapsed = min(run['time'] for run in runs)
+        loaded = [m for m in unwanted if m in runs[0]['modules']]
+        failed = loaded or (module == 'main' and elapsed > budget)
+        ok = ok and not failed
+        print(f'{"import " + module:>12} time={elapsed:8.3f}s ' 
+              + (f'budget={budget:.3f}s ' if module == 'main' else '') 
+              + (f'loads={",".join(loaded)} ' if loaded else '') + ('FAIL' if failed else 'ok'))
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('suites', nargs='*', default=['readers', 'vectorized', 'memory', 'report', 'duplicates', 'startup'],
+                        choices=['readers', 'vectorized', 'memory', 'report', 'duplicates', 'startup'])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help="rows per month for the report suite, per file for the readers suite")
+    parser.add_argument('--files', type=int, nargs='+', default=[1, 31])
+    parser.add_argument('--regression-rows', type=int, default=100000)
+    parser.add_argument('--writer', choices=['reference', 'fast'], default='reference')
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--startup-budget', type=float, default=0.5, 
+                        help="seconds allowed for importing the GUI module before its window is created")
+    parser.add_argument('--json', help="write the report suite results to this file")
+    args = parser.parse_args()
+    if 'readers' in args.suites:
+        for n_rows in args.rows:
+            bench_readers(n_rows)
+    if 'vectorized' in args.suites:
+        bench_vectorized(args.regression_rows)
+    if 'memory' in args.suites:
+        for n_rows in args.rows:
+            bench_memory(n_rows, max(args.files))
+    if 'report' in args.suites:
+        results = [bench_report(n_rows, n_files, args.writer, args.streaming) 
+                   for n_rows in args.rows for n_files in args.files]
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+    if 'duplicates' in args.suites:
+        bench_duplicates(min(args.rows), min(args.files) + 1)
+    if 'startup' in args.suites and not bench_startup(args.startup_budget):
+        sys.exit(1)
@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from src import program_code, ReportMetrics, generate_reports, update_report, scan_inputs
+
+def find_files(inputs):
+    # inputs are directories, glob patterns or files
+    files = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*.xlsx')
+        files.extend(sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern])
+    return list(dict.fromkeys(os.path.abspath(f) for f in files))
+
+def group_by_month(files):
+    # files failing the pre-flight scan are skipped before any month is built
+    months = {}
+    errors = []
+    for f in scan_inputs(files)['files']:
+        if f['problems']:
+            errors.append({'file': f['path'], 'error': '; '.join(f['problems'])})
+            continue
+        months.setdefault(f['date'].strftime('%Y%m'), []).append(f['path'])
+    return months, errors
+
+def build_month(month, files, output_paths, options, metrics_path=None, trace_memory=False):
+    warns = []
+    result = {'month': month, 'files': len(files), 'outputs': {}, 'warnings': warns}
+    metrics = ReportMetrics(log_path=metrics_path, trace_memory=trace_memory) if metrics_path else None
+    try:
+        results = generate_reports(files, output_paths, n_workers=1, warn=warns.append, metrics=metrics, 
+                                   **options)
+    except Exception as e:
+        result.update(status='error', error=f'{type(e).__name__}: {e}')
+        return result
+    if metrics is not None:
+        result['metrics'] = metrics.totals()
+    result['outputs'] = {name: output_paths[code] for name, code in program_names(output_paths).items() 
+                         if code in results}
+    result['status'] = 'ok' if results else 'empty'
+    return result
+
+def program_names(codes):
+    names = {code: name for name, code in program_code.items()}
+    return {names.get(code, str(code)): code for code in codes}
+
+def update(report_path, files, prog_code, args):
+    warns = []
+    summary = {'report': report_path, 'added': [], 'skipped': [], 'warnings': warns}
+    scan = scan_inputs(files)['files']
+    for f in scan:
+        if f['problems']:
+            summary['skipped'].append({'file': f['path'], 'error': '; '.join(f['problems'])})
+    for date, f in sorted((f['date'], f['path']) for f in scan if not f['problems']):
+        try:
+            update_report(report_path, f, prog_code, cache_dir=args.cache_dir, streaming=args.streaming, 
+                          writer=args.writer, duplicates=args.duplicates, store=args.store, 
+                          warn=warns.append)
+        except Exception as e:
+            summary['skipped'].append({'file': f, 'error': f'{type(e).__name__}: {e}'})
+            continue
+        summary['added'].append(f)
+    summary['ok'] = not summary['skipped']
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write('\n')
+    return 0 if summary['ok'] else 1
+
+def parse_program(value):
+    return program_code[value] if value in program_code else int(value)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate monthly income reports without the GUI.")
+    parser.add_argument('inputs', nargs='+', help="directories, glob patterns or daily xlsx files")
+    parser.add_argument('-o', '--output-dir', default='.')
+    parser.add_argument('-p', '--program', action='append', type=parse_program, 
+                        help="program name or code, can be repeated (default: DSI)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="months built in parallel")
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--refresh-cache', action='store_true')
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--writer', choices=['reference', 'fast'], default='reference')
+    parser.add_argument('--duplicates', choices=['drop', 'flag', 'ignore'], default='drop',
+                        help="what to do with receipts found in more than one row")
+    parser.add_argument('--store', help="also keep the extracted rows in this SQLite file")
+    parser.add_argument('--metrics', action='store_true', 
+                        help="record time and rows per stage in metrics_YYYYMM.json")
+    parser.add_argument('--trace-memory', action='store_true', 
+                        help="with --metrics, also record peak memory per stage; stage times are then "
+                             "inflated by tracemalloc and marked as traced")
+    parser.add_argument('--update', metavar='REPORT', 
+                        help="append the input days to an existing report instead of building new ones")
+    args = parser.parse_args(argv)
+
+    prog_codes = args.program or [program_code['DSI']]
+    if args.update:
+        if len(prog_codes) > 1:
+            parser.error("--update appends to one report, give at most one --program")
+        return update(args.update, find_files(args.inputs), prog_codes[0], args)
+    options = dict(cache_dir=args.cache_dir, refresh_cache=args.refresh_cache, 
+                   streaming=args.streaming, writer=args.writer, store=args.store,
+                   duplicates=args.duplicates)
+    months, errors = group_by_month(find_files(args.inputs))
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = []
+        for month, files in sorted(months.items()):
+            output_paths = {code: os.path.join(args.output_dir, f'income_report_{name}_{month}.xlsx') 
+                            for name, code in program_names(prog_codes).items()}
+            metrics_path = os.path.join(args.output_dir, f'metrics_{month}.json') if args.metrics else None
+            futures.append(executor.submit(build_month, month, files, output_paths, options, metrics_path, 
+                                           args.trace_memory))
+        results = [future.result() for future in futures]
+
+    summary = {'months': results, 'skipped': errors,
+               'ok': bool(results) and not errors and all(r['status'] != 'error' for r in results)}
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write('\n')
+    return 0 if summary['ok'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
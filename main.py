@@ -1,10 +1,31 @@
 import tkinter as tk
-from tkinter import ttk, filedialog
+from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
 import os
 import sys
+import queue
+import threading
+import multiprocessing
 
-from src import generate_report
+cache_dir = os.path.join(os.path.expanduser('~'), '.income_report', 'cache')
+
+stage_labels = {'parse': 'Reading files',
+                'sheet': 'Writing daily sheets',
+                'summary': 'Writing overview',
+                'overall': 'Writing monthly summary',
+                'save': 'Saving'}
+
+# src pulls in pandas and openpyxl, so it is imported after the window is shown, not at startup
+engine = None
+engine_lock = threading.Lock()
+
+def load_engine():
+    global engine
+    with engine_lock:
+        if engine is None:
+            import src
+            engine = src
+    return engine
 
 class ExcelFileSelector(TkinterDnD.Tk):
     def __init__(self):
@@ -17,14 +38,23 @@ class ExcelFileSelector(TkinterDnD.Tk):
         # Create listbox
         self.listbox = tk.Listbox(self, width=100, height=20, selectmode=tk.MULTIPLE)
         self.listbox.pack(fill=tk.BOTH, expand=True)
+
+        # Create progress bar and status of the running report
+        self.status = ttk.Label(self, text="")
+        self.status.pack(side=tk.BOTTOM, fill=tk.X)
+        self.progress = ttk.Progressbar(self, mode='determinate')
+        self.progress.pack(side=tk.BOTTOM, fill=tk.X)
         
         # Create add and remove buttons
         add_button = ttk.Button(self, text="Add File", command=self.add_file, style='Blue.TButton')
         add_button.pack(side=tk.LEFT, expand=True)
         remove_button = ttk.Button(self, text="Remove File", command=self.remove_file, style='Red.TButton')
         remove_button.pack(side=tk.LEFT, expand=True)
-        report_button = ttk.Button(self, text="Get Report", command=self.process_file, style='Green.TButton')
-        report_button.pack(side=tk.LEFT, expand=True)
+        self.report_button = ttk.Button(self, text="Get Report", command=self.process_file, style='Green.TButton')
+        self.report_button.pack(side=tk.LEFT, expand=True)
+        self.cancel_button = ttk.Button(self, text="Cancel", command=self.cancel_report, style='Red.TButton')
+        self.cancel_button.pack(side=tk.LEFT, expand=True)
+        self.cancel_button.state(['disabled'])
 
         # Add drag and drop functionality to the entry widget
         self.listbox.drop_target_register(DND_FILES)
@@ -39,6 +69,9 @@ class ExcelFileSelector(TkinterDnD.Tk):
         self.style.configure('Green.TButton', font='Arial 10 bold', background='#28a745', foreground='#000', padding=10, borderwidth=0)
         self.style.map('Green.TButton', background=[('active', '#218838')])
 
+        # warm up the report engine in the background once the window is up
+        self.after(100, lambda: threading.Thread(target=load_engine, daemon=True).start())
+
 
     def add_file(self, event=None):
         # Open file dialog to select Excel files
@@ -67,22 +100,111 @@ class ExcelFileSelector(TkinterDnD.Tk):
             tk.messagebox.showerror(title="Error", message="Please select a file first.")
             return
         
-        for f in self.files:
-            if not os.path.isfile(f):
-                tk.messagebox.showerror(title="Error", message="Please select a valid file.")
-                return
+        # load the engine and check every file in the background before the expensive parse starts
+        self.events = queue.Queue()
+        self.report_button.state(['disabled'])
+        self.status.configure(text="Checking files...")
+        worker = threading.Thread(target=self.run_scan, args=(list(self.files),), daemon=True)
+        worker.start()
+        self.after(100, self.poll_scan)
+
+    def run_scan(self, files):
+        try:
+            self.events.put(('scan', (files, load_engine().scan_inputs(files))))
+        except Exception as e:
+            print(e)
+            self.events.put(('error', None))
+
+    def poll_scan(self):
+        try:
+            kind, data = self.events.get_nowait()
+        except queue.Empty:
+            self.after(100, self.poll_scan)
+            return
+        self.report_button.state(['!disabled'])
+        self.status.configure(text="")
+        if kind == 'error':
+            tk.messagebox.showerror(title="Error", message="Error in checking files. Contact Aj.Sarun.")
+            return
+
+        files, scan = data
+        if not scan['ok']:
+            problems = [f"{os.path.basename(f['path'])}: {'; '.join(f['problems'])}" 
+                        for f in scan['files'] if f['problems']]
+            tk.messagebox.showerror(title="Error", message="Please select valid files.\n\n" + "\n".join(problems))
+            return
+        if scan['warnings'] and not tk.messagebox.askokcancel(title="Warning", message="\n".join(scan['warnings'])):
+            return
         output_path = filedialog.asksaveasfilename(defaultextension='.xlsx', filetypes=[("Excel files", "*.xlsx")])
         
         if output_path:
+            # run the report in a background thread so the window stays responsive
+            self.n_files = len(files)
+            self.cancel_event = threading.Event()
+            self.progress.configure(maximum=2 * self.n_files + 3, value=0)
+            self.report_button.state(['disabled'])
+            self.cancel_button.state(['!disabled'])
+            worker = threading.Thread(target=self.run_report, args=(files, output_path), daemon=True)
+            worker.start()
+            self.after(100, self.poll_report)
+
+    def run_report(self, files, output_path):
+        # runs in the worker thread, talks to the window only through self.events
+        try:
+            engine.generate_report(files, output_path, cache_dir=cache_dir, 
+                                   progress=lambda *args: self.events.put(('progress', args)),
+                                   warn=lambda message: self.events.put(('warn', message)),
+                                   cancel=self.cancel_event)
+        except engine.ReportCancelled:
+            self.events.put(('cancelled', output_path))
+        except Exception as e:
+            print(e)
+            self.events.put(('error', output_path))
+        else:
+            self.events.put(('done', output_path))
+
+    def poll_report(self):
+        while True:
             try:
-                result = generate_report(self.files, output_path)
-            except Exception as e:
-                print(e)
-                tk.messagebox.showerror(title="Error", message="Error in generating report. Contact Aj.Sarun.")
+                kind, data = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.show_progress(*data)
+            elif kind == 'warn':
+                tk.messagebox.showerror(title="Error", message=data)
+            else:
+                self.finish_report(kind, data)
                 return
+        self.after(100, self.poll_report)
+
+    def show_progress(self, stage, done, total):
+        # parsing and daily sheets take one step per file, the other stages one step each
+        n = self.n_files
+        offset = {'parse': 0, 'sheet': n, 'summary': 2 * n, 'overall': 2 * n + 1, 'save': 2 * n + 2}[stage]
+        weight = n if stage in ('parse', 'sheet') else 1
+        self.progress.configure(value=offset + weight * done / max(total, 1))
+        self.status.configure(text=f"{stage_labels[stage]} ({done}/{total})")
+
+    def cancel_report(self):
+        self.cancel_event.set()
+        self.cancel_button.state(['disabled'])
+        self.status.configure(text="Cancelling...")
+
+    def finish_report(self, kind, output_path):
+        self.report_button.state(['!disabled'])
+        self.cancel_button.state(['disabled'])
+        self.progress.configure(value=0)
+        self.status.configure(text="")
+        if kind == 'done':
             tk.messagebox.showinfo(title="Success", message=f"File processed and output saved to {output_path}.")
-        return
+        elif kind == 'cancelled':
+            tk.messagebox.showinfo(title="Cancelled", message="Report generation was cancelled.")
+        else:
+            tk.messagebox.showerror(title="Error", message="Error in generating report. Contact Aj.Sarun.")
 
 if __name__ == "__main__":
+    # needed by the process pool in generate_report when frozen by PyInstaller
+    multiprocessing.freeze_support()
     app = ExcelFileSelector()
     app.mainloop()
\ No newline at end of file
@@ -1,14 +1,27 @@
 import os.path
+import json
+import sqlite3
+import hashlib
+import zipfile
 from re import search
 from datetime import datetime
+import warnings
+from xml.etree import ElementTree
+import tracemalloc
+from time import perf_counter
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import pandas as pd
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import Font, PatternFill, Alignment, DEFAULT_FONT, numbers
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill, Alignment, NamedStyle, DEFAULT_FONT, numbers
 from openpyxl.styles.borders import Border, Side
-from openpyxl.utils import get_column_letter
+from openpyxl.utils import get_column_letter, column_index_from_string
 
-import tkinter as tk
+try:
+    import pyarrow  # noqa: F401  parquet cache is used when available
+    cache_ext = '.parquet'
+except ImportError:
+    cache_ext = '.pkl'
 
 month_name = ['มกราคม',
               'กุมภาพันธ์',
@@ -33,74 +46,865 @@ double_border = Border(left=Side(style='thin'),
                        bottom=Side(style='double'))
 
 program_code = {'DSI': 12240500161}
+program_title = {program_code['DSI']: 'หลักสูตรวิทยาศาสตรบัณฑิต สาขาวิชาวิทยาศาสตร์และนวัตกรรมข้อมูล'}
 
-def generate_report(input_files, output_path, prog_code=program_code['DSI']):
-    wb = Workbook()
-    wb.remove(wb.active)
+money_columns = ["รายได้คณะ", "กองทุนคณะ.1", "รายได้คณะ.2", "รวม"]
+report_money_columns = ['รายได้คณะ', 'กองทุนคณะ.1', 'รายได้คณะ.2', 'dep_income', 'รวม']
+summary_index = ['ปีการศึกษา', 'ภาค', 'รหัส']
+category_columns = ['วิทยาเขต', 'คณะ']
+cube_columns = ['count', 'รวม', 'รายได้คณะ', 'กองทุนคณะ.1', 'รายได้คณะ.2', 'dep_income']
+detail_columns = ['วิทยาเขต', 
+                  'คณะ', 
+                  'เลขทะเบียน', 
+                  'เลขที่ใบเสร็จ', 
+                  'ชื่อ นามสกุล', 
+                  'ปีการศึกษา', 
+                  'ภาค', 
+                  'รายได้คณะ', 
+                  'กองทุนคณะ.1', 
+                  'รายได้คณะ.2', 
+                  'รวม']
 
-    dates = []
-    total_stats = []
-    dfs = []
-    for excel_path in input_files:
-        excel_fn = os.path.basename(excel_path)
-        # extract transactions' date
-        match = search(r'\d{4}\d{2}\d{2}', excel_fn)
-        date = datetime.strptime(match.group(), '%Y%m%d').date()
-        dates.append(date)
-        # extract transactions' summary
-        df = extract_excel(excel_path, prog_code)
-        # export to excel
-        total_stat = write_oneday_report(df, wb, date)
-        total_stats.extend(total_stat)
-        dfs.append(df)
+cache_version = 4
+cache_max_bytes = 512 * 1024 * 1024
+sidecar_version = 4
+
+class ReportCancelled(Exception):
+    pass
+
+class ReportMetrics:
+    # wall time, rows and, with trace_memory, peak memory of each stage of a report run. 
+    # tracemalloc slows allocation-heavy stages several times over, so times of a traced run 
+    # are marked as such; time a separate untraced run when both matter
+    enabled = True
+
+    def __init__(self, log_path=None, trace_memory=False):
+        self.log_path = log_path
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._tracing = False
+
+    @contextmanager
+    def stage(self, name, **info):
+        record = dict(stage=name, rows=0, **info)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            tracemalloc.reset_peak()
+        start = perf_counter()
+        try:
+            yield record
+        finally:
+            record['time'] = perf_counter() - start
+            if self.trace_memory:
+                record['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+            self.stages.append(record)
+
+    def extend(self, stages):
+        self.stages.extend(stages)
+
+    def totals(self):
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(record['stage'], {'count': 0, 'time': 0, 'rows': 0, 
+                                                        'traced': self.trace_memory})
+            total['count'] += 1
+            total['time'] += record['time']
+            total['rows'] += record['rows']
+            if 'peak_mb' in record:
+                total['peak_mb'] = max(total.get('peak_mb', 0), record['peak_mb'])
+        return totals
+
+    def finish(self):
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        if self.log_path is not None:
+            with open(self.log_path, 'w', encoding='utf-8') as f:
+                json.dump({'traced': self.trace_memory, 'stages': self.stages, 'totals': self.totals()}, 
+                          f, ensure_ascii=False, indent=2)
+
+class _NoMetrics:
+    # stand-in when instrumentation is off, every stage is the same empty context
+    enabled = False
+    trace_memory = False
+    _stage = nullcontext({})
+
+    def stage(self, name, **info):
+        return self._stage
+
+    def extend(self, stages):
+        pass
+
+    def finish(self):
+        pass
+
+no_metrics = _NoMetrics()
+
+def generate_report(input_files, output_path, prog_code=program_code['DSI'], n_workers=None,
+                    cache_dir=None, refresh_cache=False, streaming=False, writer='reference',
+                    sidecar=True, store=None, duplicates='drop', progress=None, warn=None, cancel=None, 
+                    metrics=None):
+    results = generate_reports(input_files, {prog_code: output_path}, n_workers=n_workers,
+                               cache_dir=cache_dir, refresh_cache=refresh_cache, streaming=streaming,
+                               writer=writer, sidecar=sidecar, store=store, duplicates=duplicates, 
+                               progress=progress, warn=warn, cancel=cancel, metrics=metrics)
+    if prog_code not in results:
+        raise ValueError(f'No transactions of program {prog_code} in input files')
+    return results[prog_code]
+
+def generate_reports(input_files, output_paths, n_workers=None, cache_dir=None, 
+                     refresh_cache=False, streaming=False, writer='reference', sidecar=True, store=None,
+                     duplicates='drop', progress=None, warn=None, cancel=None, metrics=None):
+    # read every file once and write one workbook per program in output_paths.
+    # progress(stage, done, total) is called after each file parsed, sheet written and 
+    # before saving; warn(message) reports problems in the inputs; setting the cancel 
+    # event stops the run between files with ReportCancelled; a ReportMetrics collects
+    # time, rows and peak memory of every stage; the extracted rows are also kept in the
+    # SQLite file store when given; receipts repeated across files are dropped ('drop'),
+    # kept ('flag') or not looked for ('ignore'), repeats are listed in a duplicates sheet
+    if metrics is None:
+        metrics = no_metrics
+    try:
+        return _generate_reports(input_files, output_paths, n_workers, cache_dir, refresh_cache, streaming, 
+                                 writer, sidecar, store, duplicates, progress, warn, cancel, metrics)
+    finally:
+        metrics.finish()
+
+def _generate_reports(input_files, output_paths, n_workers, cache_dir, refresh_cache, streaming,
+                      writer, sidecar, store, duplicates, progress, warn, cancel, metrics):
+    prog_codes = list(output_paths)
+    if warn is None:
+        warn = warnings.warn
+
+    # extract transactions' date and process files in date order
+    dated_files = sorted(((extract_date(f), f) for f in input_files), key=lambda x: x[0])
+    dates = [date for date, _ in dated_files]
+    # extract transactions' summary
+    frames = extract_programs([f for _, f in dated_files], prog_codes, n_workers, cache_dir=cache_dir,
+                              refresh_cache=refresh_cache, streaming=streaming, 
+                              progress=progress, cancel=cancel, metrics=metrics)
+    if store is not None:
+        with metrics.stage('store') as record:
+            write_store(store, [f for _, f in dated_files], dates, frames)
+            record['rows'] = sum(len(df) for f in frames for df in f.values())
 
     # warning when data of multiple months are provided
     month = list(set([(d.month, d.year) for d in dates]))
     if len(month) > 1:
-        tk.messagebox.showerror(title="Error", message="Files contain data from different months")
+        warn("Files contain data from different months")
+
+    sources = [os.path.basename(f) for _, f in dated_files]
+    results = {}
+    for prog_code in prog_codes:
+        dfs = [f[prog_code] for f in frames]
+        if all(df.empty for df in dfs):
+            continue
+        with metrics.stage('duplicates') as record:
+            dfs, conflicts = check_duplicates(dfs, dates, sources, duplicates, warn)
+            record['rows'] = 0 if conflicts is None else len(conflicts)
+        write_report(dfs, dates, month, output_paths[prog_code], 
+                     program_title.get(prog_code, f'รหัสหลักสูตร {prog_code}'), writer, sidecar=sidecar, 
+                     conflicts=conflicts, progress=progress, cancel=cancel, metrics=metrics)
+        results[prog_code] = dfs
+    return results
+
+def write_report(dfs, dates, month, output_path, title=program_title[program_code['DSI']], 
+                 writer='reference', sidecar=True, conflicts=None, progress=None, cancel=None, 
+                 metrics=no_metrics):
+    write_oneday, write_summary, write_overall = report_writers[writer]
+    wb = Workbook()
+    wb.remove(wb.active)
+
+    # every sum and count the sheets need, from one pass over all rows
+    with metrics.stage('aggregate') as record:
+        cube = aggregate_cube(dfs)
+        day_aggs = split_cube(cube, len(dfs))
+        record['rows'] = sum(len(df) for df in dfs)
+
+    total_stats = []
+    days = []
+    for i, (df, date, agg) in enumerate(zip(dfs, dates, day_aggs), 1):
+        check_cancel(cancel)
+        # export to excel
+        with metrics.stage('oneday', date=date.isoformat()) as record:
+            total_stat = write_oneday(df, wb, date, title, agg)
+            total_stats.extend(total_stat)
+            if sidecar:
+                days.append(day_aggregates(agg, date, total_stat))
+            record['rows'] = len(df)
+        report_progress(progress, 'sheet', i, len(dfs))
     
-    write_summary_report(wb, dfs)
+    check_cancel(cancel)
+    with metrics.stage('summary') as record:
+        write_summary(wb, summary_tables(cube))
+        record['rows'] = len(cube)
+    report_progress(progress, 'summary', 1, 1)
+
+    with metrics.stage('overall') as record:
+        write_overall(wb, total_stats, month, title)
+        record['rows'] = len(total_stats)
+    if conflicts is not None and len(conflicts):
+        write_duplicates_report(wb, conflicts)
+    report_progress(progress, 'overall', 1, 1)
 
-    write_overall_report(wb, total_stats, month)
+    check_cancel(cancel)
+    report_progress(progress, 'save', 0, 1)
+    with metrics.stage('save', output=os.path.basename(output_path)):
+        save_workbook(wb, output_path)
+        if sidecar:
+            write_sidecar(output_path, {'month': month, 'title': title, 'days': days, 
+                                        'duplicates': duplicate_records(conflicts), 
+                                        'receipts': receipt_records(dfs)})
+    report_progress(progress, 'save', 1, 1)
 
+def save_workbook(wb, output_path):
     _font = Font(name="TH SarabunPSK", sz=16)
     {k: setattr(DEFAULT_FONT, k, v) for k, v in _font.__dict__.items()}
     wb.save(output_path)
+
+def update_report(report_path, input_file, prog_code=program_code['DSI'], cache_dir=None, 
+                  streaming=False, writer='reference', duplicates='drop', store=None, warn=None):
+    # append one new day to a report written by generate_report, the overview and monthly 
+    # sheets are rebuilt from the per-day aggregates in the sidecar file. receipts of the new
+    # day already in the report are dropped, flagged or ignored, and its rows are kept in the 
+    # store, as in generate_report
+    if warn is None:
+        warn = warnings.warn
+    meta = read_sidecar(report_path)
+    days = meta['days']
+    date = extract_date(input_file)
+    if any(day['date'] == date.isoformat() for day in days):
+        raise ValueError(f'Transactions of {date} are already in {report_path}')
+    df = extract_excels([input_file], prog_code, n_workers=1, cache_dir=cache_dir, streaming=streaming)[0]
+    if store is not None:
+        write_store(store, [input_file], [date], [{prog_code: df}])
+    receipts = meta['receipts']
+    df, conflicts = check_day_duplicates(df, date, os.path.basename(input_file), receipts, duplicates, warn)
+    if df.empty:
+        raise ValueError(f'All transactions of {date} are already in {report_path}')
+
+    # warning when data of multiple months are provided
+    month = [tuple(m) for m in meta['month']]
+    if (date.month, date.year) not in month:
+        warn("Files contain data from different months")
+        month.append((date.month, date.year))
+
+    write_oneday, write_summary, write_overall = report_writers[writer]
+    wb = load_workbook(report_path)
+    # daily sheets come first, everything after them is rebuilt
+    n_day_sheets = sum(day['sheets'] for day in days)
+    for ws in wb.worksheets[n_day_sheets:]:
+        wb.remove(ws)
+
+    # keep daily sheets in date order
+    agg = split_cube(aggregate_cube([df]), 1)[0]
+    total_stat = write_oneday(df, wb, date, meta['title'], agg)
+    offset = sum(day['sheets'] for day in days if day['date'] <= date.isoformat()) - n_day_sheets
+    for ws in wb.worksheets[n_day_sheets:]:
+        wb.move_sheet(ws, offset)
+    days.append(day_aggregates(agg, date, total_stat))
+    days.sort(key=lambda day: day['date'])
+
+    write_summary(wb, _summary_tables_from_days(days))
+    write_overall(wb, _total_stats_from_days(days), month, meta['title'])
+    conflicts = meta['duplicates'] + duplicate_records(conflicts)
+    if conflicts:
+        write_duplicates_report(wb, _conflicts_from_records(conflicts))
+    save_workbook(wb, report_path)
+    known = set((receipt, reg_no) for receipt, reg_no, _ in receipts)
+    receipts = receipts + [r for r in receipt_records([df]) if (r[0], r[1]) not in known]
+    write_sidecar(report_path, dict(meta, month=month, days=days, duplicates=conflicts, receipts=receipts))
+    return df
+
+def sidecar_path(output_path):
+    return os.path.splitext(output_path)[0] + '.json'
+
+def read_sidecar(output_path):
+    fn = sidecar_path(output_path)
+    meta = None
+    if os.path.isfile(fn):
+        with open(fn, encoding='utf-8') as f:
+            meta = json.load(f)
+    if meta is None or meta.get('version') != sidecar_version:
+        raise ValueError(f'{output_path} has no up to date {os.path.basename(fn)}, generate the report again')
+    return meta
+
+def write_sidecar(output_path, meta):
+    with open(sidecar_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(dict(meta, version=sidecar_version), f, ensure_ascii=False, default=_json_value)
+
+def _json_value(value):
+    # numpy scalars from pandas
+    return value.item()
+
+
+def day_aggregates(agg, date, total_stat):
+    # everything the overview and monthly sheets need from one day
+    overview = [[*key, int(row[0])] + row[1:] for key, row in zip(agg.index, agg.values.tolist())]
+    overall = [[*d, total_list, total, res] for d, (total_list, total, _, res) in total_stat]
+    return {'date': date.isoformat(), 'sheets': len(total_stat), 'overview': overview, 'overall': overall}
+
+def _summary_tables_from_days(days):
+    cube = pd.DataFrame([[i] + row for i, day in enumerate(days) for row in day['overview']], 
+                        columns=['file'] + summary_index + cube_columns)
+    return summary_tables(cube.set_index(['file'] + summary_index))
+
+def _total_stats_from_days(days):
+    total_stats = []
+    for day in days:
+        date = datetime.strptime(day['date'], '%Y-%m-%d').date()
+        for year, sem, total_list, total, res in day['overall']:
+            total_stats.append(((year, sem), [total_list, total, date, res]))
+    return total_stats
+
+receipt_keys = ['เลขที่ใบเสร็จ', 'เลขทะเบียน']
+duplicate_columns = ['date', 'source'] + receipt_keys + ['ชื่อ นามสกุล', 'ปีการศึกษา', 'ภาค', 'รวม', 
+                                                          'repeat', 'mismatch']
+
+def find_duplicates(dfs, dates, sources):
+    # one hash pass over the (receipt, registration) pair of every row in every file, the 
+    # first occurrence is kept and later ones are marked as repeats
+    df = pd.concat(dfs, keys=range(len(dfs)), names=['file']).reset_index()
+    keys = receipt_key_frame(df)
+    has_key = keys.notna().all(axis=1)
+    repeat = keys.duplicated(keep='first') & has_key
+    involved = keys.duplicated(keep=False) & has_key
+
+    conflicts = df[involved].copy()
+    conflicts['date'] = [dates[i] for i in conflicts['file']]
+    conflicts['source'] = [sources[i] for i in conflicts['file']]
+    conflicts['repeat'] = repeat[involved]
+    # the same receipt with different amounts needs a closer look than a plain re-download
+    conflict_keys = keys[involved].assign(file=conflicts['file'])
+    conflicts['mismatch'] = conflicts.groupby([conflict_keys[c] for c in receipt_keys])['รวม'].transform('nunique') > 1
+    conflicts = conflicts.loc[conflict_keys.sort_values(receipt_keys + ['file'], kind='mergesort').index]
+
+    keep = ~repeat.to_numpy()
+    offsets = [0]
+    for d in dfs:
+        offsets.append(offsets[-1] + len(d))
+    kept = [d[keep[start:end]] for d, start, end in zip(dfs, offsets, offsets[1:])]
+    return kept, conflicts
+
+def receipt_key_frame(df):
+    # receipts are numbers or text depending on the file, compare them as text
+    return pd.DataFrame({c: df[c].map(_cell_to_str) for c in receipt_keys}, index=df.index)
+
+def check_duplicates(dfs, dates, sources, duplicates='drop', warn=warnings.warn):
+    if duplicates == 'ignore':
+        return dfs, None
+    kept, conflicts = find_duplicates(dfs, dates, sources)
+    n_repeat = int(conflicts['repeat'].sum())
+    if n_repeat:
+        warn(f"{n_repeat} receipts appear more than once in the input files, see the duplicates sheet")
+    return (kept if duplicates == 'drop' else dfs), conflicts
+
+def duplicate_records(conflicts):
+    # the duplicates sheet as kept in the sidecar
+    if conflicts is None:
+        return []
+    records = conflicts[duplicate_columns].to_dict('records')
+    for r in records:
+        r['date'] = r['date'].isoformat()
+    return records
+
+def _conflicts_from_records(records):
+    conflicts = pd.DataFrame(records, columns=duplicate_columns)
+    conflicts['date'] = pd.to_datetime(conflicts['date'])
+    return conflicts
+
+def receipt_records(dfs):
+    # (receipt, registration, amount) of the first row of each receipt, kept in the sidecar 
+    # so days added later can be checked against them
+    first = {}
+    for df in dfs:
+        keys = receipt_key_frame(df)
+        for receipt, reg_no, total in zip(keys[receipt_keys[0]], keys[receipt_keys[1]], df['รวม']):
+            if receipt is not None and reg_no is not None:
+                first.setdefault((receipt, reg_no), int(total))
+    return [[receipt, reg_no, total] for (receipt, reg_no), total in first.items()]
+
+def check_day_duplicates(df, date, source, receipts, duplicates='drop', warn=warnings.warn):
+    # one new day against the receipt_records of a report, only the new rows are hashed
+    if duplicates == 'ignore':
+        return df, None
+    first = {(receipt, reg_no): total for receipt, reg_no, total in receipts}
+    keys = receipt_key_frame(df)
+    repeat = []
+    mismatch = []
+    for receipt, reg_no, total in zip(keys[receipt_keys[0]], keys[receipt_keys[1]], df['รวม']):
+        key = (receipt, reg_no)
+        seen = receipt is not None and reg_no is not None and key in first
+        repeat.append(seen)
+        mismatch.append(seen and first[key] != total)
+        if receipt is not None and reg_no is not None:
+            first.setdefault(key, int(total))
+    repeat = pd.Series(repeat, dtype=bool).to_numpy()
+
+    conflicts = df[repeat].reset_index()
+    conflicts['date'] = date
+    conflicts['source'] = source
+    conflicts['repeat'] = True
+    conflicts['mismatch'] = pd.Series(mismatch, dtype=bool).to_numpy()[repeat]
+    if len(conflicts):
+        warn(f"{len(conflicts)} receipts of {date} are already in the report, see the duplicates sheet")
+    return (df[~repeat] if duplicates == 'drop' else df), conflicts
+
+store_columns = ['ปีการศึกษา', 'ภาค', 'รหัส', 'วิทยาเขต', 'คณะ', 'เลขทะเบียน', 'เลขที่ใบเสร็จ', 'ชื่อ นามสกุล', 
+                 'รายได้คณะ', 'กองทุนคณะ.1', 'รายได้คณะ.2', 'dep_income', 'รวม']
+
+def open_store(store_path):
+    # months built in parallel by cli.py write to the same file, wait for each other's locks
+    con = sqlite3.connect(store_path, timeout=60)
+    columns = ', '.join(f'"{c}"' for c in store_columns)
+    con.executescript(f'''
+        CREATE TABLE IF NOT EXISTS transactions ("date" TEXT, "prog_code" INTEGER, "source" TEXT, {columns});
+        CREATE INDEX IF NOT EXISTS ix_term ON transactions 
+            ("prog_code", "ปีการศึกษา", "ภาค", "รหัส", "date", "เลขที่ใบเสร็จ");
+        CREATE INDEX IF NOT EXISTS ix_date ON transactions ("prog_code", "date");
+        CREATE INDEX IF NOT EXISTS ix_source ON transactions ("prog_code", "source");
+    ''')
+    return con
+
+def write_store(store_path, paths, dates, frames):
+    # rows of a file replace whatever an earlier run stored for the same file name
+    con = open_store(store_path)
+    try:
+        with con:
+            for path, date, f in zip(paths, dates, frames):
+                source = os.path.basename(path)
+                for prog_code, df in f.items():
+                    con.execute('DELETE FROM transactions WHERE prog_code = ? AND source = ?', (prog_code, source))
+                    rows = df.reset_index()[store_columns]
+                    rows['เลขที่ใบเสร็จ'] = rows['เลขที่ใบเสร็จ'].map(_cell_to_str)
+                    rows.insert(0, 'source', source)
+                    rows.insert(0, 'prog_code', prog_code)
+                    rows.insert(0, 'date', date.isoformat())
+                    rows.to_sql('transactions', con, if_exists='append', index=False)
+    finally:
+        con.close()
+
+def read_store(store_path, prog_code=program_code['DSI'], start=None, end=None, year=None, term=None, 
+               cohorts=None):
+    # stored rows of one program between the start and end dates (inclusive) and optionally 
+    # of one academic year, term or list of cohorts, in date and file order
+    where = ['prog_code = ?']
+    params = [prog_code]
+    for clause, value in [('"date" >= ?', start and start.isoformat()), 
+                          ('"date" <= ?', end and end.isoformat()),
+                          ('"ปีการศึกษา" = ?', year), 
+                          ('"ภาค" = ?', term)]:
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    if cohorts is not None:
+        where.append(f'"รหัส" IN ({", ".join("?" * len(cohorts))})')
+        params.extend(cohorts)
+
+    con = open_store(store_path)
+    try:
+        df = pd.read_sql_query(f'SELECT * FROM transactions WHERE {" AND ".join(where)} ORDER BY "date", rowid', 
+                               con, params=params)
+    finally:
+        con.close()
+    df['date'] = pd.to_datetime(df['date']).dt.date
+    return df.drop(columns=['prog_code', 'source']).set_index(summary_index)
+
+def generate_report_from_store(store_path, output_path, prog_code=program_code['DSI'], start=None, end=None, 
+                               year=None, term=None, cohorts=None, writer='reference', duplicates='drop', 
+                               warn=None):
+    # the same workbook as generate_report, built from the store instead of the Excel files
+    if warn is None:
+        warn = warnings.warn
+    df = read_store(store_path, prog_code, start, end, year, term, cohorts)
+    if df.empty:
+        raise ValueError(f'No transactions of program {prog_code} in {store_path}')
+    dates = []
+    dfs = []
+    for date, day in df.groupby('date', sort=True):
+        dates.append(date)
+        dfs.append(day.drop(columns='date'))
+
+    # warning when data of multiple months are provided
+    month = list(set([(d.month, d.year) for d in dates]))
+    if len(month) > 1:
+        warn("Files contain data from different months")
+    dfs, conflicts = check_duplicates(dfs, dates, [d.isoformat() for d in dates], duplicates, warn)
+    write_report(dfs, dates, month, output_path, program_title.get(prog_code, f'รหัสหลักสูตร {prog_code}'),
+                 writer, sidecar=False, conflicts=conflicts)
     return dfs
 
+def report_progress(progress, stage, done, total):
+    if progress is not None:
+        progress(stage, done, total)
+
+def check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise ReportCancelled()
+
+def extract_date(path):
+    excel_fn = os.path.basename(path)
+    match = search(r'\d{4}\d{2}\d{2}', excel_fn)
+    if match is None:
+        raise ValueError(f'No YYYYMMDD date in file name {excel_fn}')
+    return datetime.strptime(match.group(), '%Y%m%d').date()
+
+def scan_inputs(paths, n_workers=8):
+    # cheap checks of every file before the full parse: file name date, workbook, Detail 
+    # sheet and its header row, read straight from the xlsx zip in a thread pool
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        files = list(executor.map(scan_file, paths))
+
+    warns = []
+    dates = [f['date'] for f in files if f['date'] is not None]
+    months = sorted(set([(d.year, d.month) for d in dates]))
+    if len(months) > 1:
+        warns.append("Files contain data from different months")
+    for date in sorted(set([d for d in dates if dates.count(d) > 1])):
+        warns.append(f"More than one file for {date}")
+    return {'files': files, 'months': months, 'warnings': warns, 
+            'ok': not any(f['problems'] for f in files)}
+
+def scan_file(path):
+    problems = []
+    date = None
+    try:
+        date = extract_date(path)
+    except ValueError as e:
+        problems.append(str(e))
+    if not os.path.isfile(path):
+        problems.append("File not found")
+        return {'path': path, 'date': date, 'problems': problems}
+
+    try:
+        header = _xlsx_header(path, "Detail", row=2)
+    except Exception as e:
+        problems.append(f"Not an Excel workbook ({type(e).__name__})")
+        return {'path': path, 'date': date, 'problems': problems}
+    if header is None:
+        problems.append('No "Detail" sheet')
+    else:
+        header = _mangle_header(header)
+        missing = [c for c in ['รหัสหลักสูตร'] + detail_columns if c not in header]
+        if missing:
+            problems.append("Missing columns: " + ", ".join(missing))
+    return {'path': path, 'date': date, 'problems': problems}
+
+xlsx_ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+xlsx_rel_id = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+def _xlsx_header(path, sheet_name, row=2):
+    # one row of a sheet without loading the workbook: the sheet xml is read up to that row 
+    # and the shared strings only up to the last one the row uses. None when there is no such sheet
+    with zipfile.ZipFile(path) as zf:
+        workbook = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+        rels = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        targets = {r.get('Id'): r.get('Target') for r in rels}
+        sheets = {s.get('name'): targets[s.get(xlsx_rel_id)] for s in workbook.iter(f'{{{xlsx_ns}}}sheet')}
+        if sheet_name not in sheets:
+            return None
+
+        cells = []
+        n = 0
+        with zf.open(_xlsx_member(sheets[sheet_name])) as f:
+            for _, elem in ElementTree.iterparse(f):
+                if elem.tag != f'{{{xlsx_ns}}}row':
+                    continue
+                n = int(elem.get('r', n + 1))
+                if n == row:
+                    cells = [_xlsx_cell(c, i) for i, c in enumerate(elem.iter(f'{{{xlsx_ns}}}c'), 1)]
+                if n >= row:
+                    break
+                elem.clear()
+
+        shared = [int(value) for _, kind, value in cells if kind == 's']
+        strings = []
+        if shared:
+            target = [r.get('Target') for r in rels if r.get('Type').endswith('/sharedStrings')][0]
+            with zf.open(_xlsx_member(target)) as f:
+                for _, elem in ElementTree.iterparse(f):
+                    if elem.tag != f'{{{xlsx_ns}}}si':
+                        continue
+                    texts = elem.findall(f'{{{xlsx_ns}}}t') + elem.findall(f'{{{xlsx_ns}}}r/{{{xlsx_ns}}}t')
+                    strings.append(''.join(t.text or '' for t in texts))
+                    if len(strings) > max(shared):
+                        break
+                    elem.clear()
+
+    header = [None] * max([col for col, _, _ in cells], default=0)
+    for col, kind, value in cells:
+        header[col - 1] = strings[int(value)] if kind == 's' else value
+    return header
+
+def _xlsx_member(target):
+    # relationship targets are relative to xl/ unless absolute
+    return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+
+def _xlsx_cell(c, i):
+    ref = c.get('r')
+    col = column_index_from_string(ref.rstrip('0123456789')) if ref else i
+    kind = c.get('t')
+    if kind == 'inlineStr':
+        value = ''.join(t.text or '' for t in c.iter(f'{{{xlsx_ns}}}t'))
+    else:
+        v = c.find(f'{{{xlsx_ns}}}v')
+        value = None if v is None else v.text
+    return col, kind, value
+
+def extract_excels(paths, prog_code, n_workers=None, cache_dir=None, refresh_cache=False,
+                   streaming=False):
+    frames = extract_programs(paths, [prog_code], n_workers, cache_dir=cache_dir, 
+                              refresh_cache=refresh_cache, streaming=streaming)
+    return [f[prog_code] for f in frames]
+
+def extract_programs(paths, prog_codes, n_workers=None, cache_dir=None, refresh_cache=False,
+                     streaming=False, progress=None, cancel=None, metrics=no_metrics):
+    frames = [{} for _ in paths]
+    if cache_dir is not None and not refresh_cache:
+        for path, f in zip(paths, frames):
+            with metrics.stage('cache', file=os.path.basename(path)) as record:
+                for prog_code in prog_codes:
+                    df = read_cache(path, prog_code, cache_dir, streaming)
+                    if df is not None:
+                        f[prog_code] = df
+                record['rows'] = sum(len(df) for df in f.values())
+
+    # parse only files missing from the cache
+    todo = [i for i, f in enumerate(frames) if len(f) < len(prog_codes)]
+    done = len(paths) - len(todo)
+    report_progress(progress, 'parse', done, len(paths))
+    for j, f in _parse_excels([paths[i] for i in todo], prog_codes, n_workers, streaming, cancel, metrics):
+        i = todo[j]
+        for prog_code, df in f.items():
+            if prog_code in frames[i]:
+                continue
+            frames[i][prog_code] = df
+            if cache_dir is not None:
+                write_cache(df, paths[i], prog_code, cache_dir, streaming)
+        done += 1
+        report_progress(progress, 'parse', done, len(paths))
+
+    if cache_dir is not None and todo:
+        prune_cache(cache_dir)
+    return frames
+
+def _parse_excels(paths, prog_codes, n_workers=None, streaming=False, cancel=None, metrics=no_metrics):
+    # parse files in a process pool and yield (index, frames) as each file finishes
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, len(paths))
+    if n_workers <= 1:
+        for i, path in enumerate(paths):
+            check_cancel(cancel)
+            yield i, _extract_file(path, prog_codes, streaming, metrics)
+        return
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        # workers measure into their own ReportMetrics, sent back with the frames
+        worker_metrics = ReportMetrics(trace_memory=metrics.trace_memory) if metrics.enabled else None
+        futures = {executor.submit(_extract_file_measured, path, prog_codes, streaming, worker_metrics): i 
+                   for i, path in enumerate(paths)}
+        for future in as_completed(futures):
+            if cancel is not None and cancel.is_set():
+                # files already being parsed finish, the rest never start
+                executor.shutdown(cancel_futures=True)
+                raise ReportCancelled()
+            frames, stages = future.result()
+            metrics.extend(stages)
+            yield futures[future], frames
+
+def _extract_file(path, prog_codes, streaming=False, metrics=no_metrics):
+    with metrics.stage('extract', file=os.path.basename(path)) as record:
+        frames = extract_excel_programs(path, prog_codes, streaming)
+        record['rows'] = sum(len(df) for df in frames.values())
+    return frames
+
+def _extract_file_measured(path, prog_codes, streaming=False, metrics=None):
+    if metrics is None:
+        return extract_excel_programs(path, prog_codes, streaming), []
+    return _extract_file(path, prog_codes, streaming, metrics), metrics.stages
+
+def cache_path(path, prog_code, cache_dir, streaming=False):
+    # entries are keyed on file identity so any change to the file misses the cache, and on 
+    # the reader so a frame is only reused by the reader that produced it
+    st = os.stat(path)
+    reader = 'stream' if streaming else 'read_excel'
+    key = f'{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{prog_code}|{reader}|{cache_version}'
+    return os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + cache_ext)
+
+def read_cache(path, prog_code, cache_dir, streaming=False):
+    # months built in parallel by cli.py share the cache, an entry may be pruned by another 
+    # process at any point
+    fn = cache_path(path, prog_code, cache_dir, streaming)
+    if not os.path.isfile(fn):
+        return None
+    try:
+        df = pd.read_parquet(fn) if cache_ext == '.parquet' else pd.read_pickle(fn)
+    except Exception:
+        _remove_entry(fn)
+        return None
+    try:
+        os.utime(fn)    # mark as recently used for eviction
+    except FileNotFoundError:
+        pass
+    return df
+
+def write_cache(df, path, prog_code, cache_dir, streaming=False):
+    os.makedirs(cache_dir, exist_ok=True)
+    fn = cache_path(path, prog_code, cache_dir, streaming)
+    tmp = f'{fn}.{os.getpid()}.tmp'
+    if cache_ext == '.parquet':
+        df.to_parquet(tmp)
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp, fn)
+
+def prune_cache(cache_dir, max_bytes=cache_max_bytes):
+    # evict least recently used entries until the cache fits in max_bytes
+    entries = []
+    for fn in os.listdir(cache_dir):
+        if fn.endswith(cache_ext):
+            try:
+                st = os.stat(os.path.join(cache_dir, fn))
+            except FileNotFoundError:   # pruned by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, fn))
+    total = sum(size for _, size, _ in entries)
+    for _, size, fn in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove_entry(os.path.join(cache_dir, fn))
+        total -= size
+
+def _remove_entry(fn):
+    try:
+        os.remove(fn)
+    except FileNotFoundError:
+        pass
+
+def clear_cache(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return
+    for fn in os.listdir(cache_dir):
+        if fn.endswith(('.parquet', '.pkl', '.tmp')):
+            os.remove(os.path.join(cache_dir, fn))
+
 def extract_excel(path, prog_code):
-    cols = ["รายได้คณะ", "กองทุนคณะ.1", "รายได้คณะ.2", "รวม"]
-    
+    return extract_excel_programs(path, [prog_code])[prog_code]
+
+def extract_excel_stream(path, prog_code):
+    return extract_excel_programs(path, [prog_code], streaming=True)[prog_code]
+
+def extract_excel_programs(path, prog_codes, streaming=False):
+    # split rows of all programs from a single read of the Detail sheet
+    df = _read_detail_stream(path, prog_codes) if streaming else _read_detail(path, prog_codes)
+    groups = dict(list(df.groupby('รหัสหลักสูตร')))
+    return {prog_code: _detail_frame(groups.get(prog_code, df.iloc[:0])) for prog_code in prog_codes}
+
+def _read_detail(path, prog_codes):
     df = pd.read_excel(path, header=1, sheet_name="Detail", dtype={'เลขทะเบียน':str})
-    df[cols] = df[cols].astype('float64')   # convert all numbers to float
-    df = df.assign(dep_income=df['รายได้คณะ'] + df['กองทุนคณะ.1'] + df['รายได้คณะ.2'])
-
-    df = df[df['รหัสหลักสูตร'] == prog_code]  # keep only only DSI students
-    df_filtered = df[['วิทยาเขต', 
-                      'คณะ', 
-                      'เลขทะเบียน', 
-                      'เลขที่ใบเสร็จ', 
-                      'ชื่อ นามสกุล', 
-                      'ปีการศึกษา', 
-                      'ภาค', 
-                      'รายได้คณะ', 
-                      'กองทุนคณะ.1', 
-                      'รายได้คณะ.2', 
-                      'dep_income', 
-                      'รวม']].copy()
-    df_filtered['รหัส'] = df_filtered.apply(lambda row: row['เลขทะเบียน'].strip()[:2], axis = 1)
+    return df[df['รหัสหลักสูตร'].isin(prog_codes)]  # keep only requested programs
+
+def _read_detail_stream(path, prog_codes):
+    # read only the needed columns and drop rows of other programs while streaming
+    columns = ['รหัสหลักสูตร'] + detail_columns
+    prog_codes = set(prog_codes)
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb["Detail"].iter_rows(min_row=2, values_only=True)
+        header = _mangle_header(next(rows))
+        col_i = [header.index(c) for c in columns]
+        code_i = col_i[0]
+        data = [[row[i] for i in col_i] for row in rows 
+                if len(row) > code_i and row[code_i] in prog_codes]
+    finally:
+        wb.close()
+
+    df = pd.DataFrame(data, columns=columns)
+    df['เลขทะเบียน'] = df['เลขทะเบียน'].map(_cell_to_str)
+    # read_excel turns text columns that hold only numbers (e.g. receipt numbers) into numbers
+    for c in df.columns:
+        if c != 'เลขทะเบียน' and df[c].dtype == object:
+            try:
+                df[c] = pd.to_numeric(df[c])
+            except (ValueError, TypeError):
+                pass
+    return df
+
+def _mangle_header(names):
+    # name duplicated columns the same way as pd.read_excel, e.g. รายได้คณะ.1
+    seen = set()
+    header = []
+    for i, name in enumerate(names):
+        name = f'Unnamed: {i}' if name is None else name
+        new_name, k = name, 0
+        while new_name in seen:
+            k += 1
+            new_name = f'{name}.{k}'
+        seen.add(new_name)
+        header.append(new_name)
+    return header
+
+def _cell_to_str(value):
+    if pd.isna(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def cohort_code(reg_no):
+    # the first two digits of the student's code is their year's code
+    return reg_no.str.strip().str[:2]
+
+def _detail_frame(df):
+    df_filtered = df[detail_columns].copy()
+    # keep money as integer satang so sums are exact, empty amounts count as zero
+    money = df_filtered[money_columns].astype('float64').fillna(0)
+    df_filtered[money_columns] = (money * 100).round().astype('int64')
+    df_filtered.insert(detail_columns.index('รวม'), 'dep_income', 
+                       df_filtered['รายได้คณะ'] + df_filtered['กองทุนคณะ.1'] + df_filtered['รายได้คณะ.2'])
+    df_filtered = df_filtered.astype({c: 'category' for c in category_columns})
+    df_filtered['รหัส'] = cohort_code(df_filtered['เลขทะเบียน'])
     return df_filtered.set_index(['ปีการศึกษา', 'ภาค', 'รหัส'])
 
 
+def aggregate_cube(dfs):
+    # count and sums by (file, academic year, term, cohort) in a single groupby over all rows
+    df = pd.concat(dfs, keys=range(len(dfs)), names=['file'])
+    groups = df[report_money_columns].groupby(level=[0,1,2,3])
+    cube = groups.sum()
+    cube['count'] = groups.size()
+    return cube[cube_columns]
+
+def split_cube(cube, n_files):
+    # one (academic year, term, cohort) table per input file
+    days = {i: agg.droplevel(0) for i, agg in cube.groupby(level=0)}
+    empty = cube.iloc[:0].droplevel(0)
+    return [days.get(i, empty) for i in range(n_files)]
+
+def summary_tables(cube):
+    # calculate summary of the month from the per-day totals
+    sums = cube.groupby(level=[1,2,3]).sum()
+    return {academic_term: ov.droplevel([0,1]) for academic_term, ov in sums.groupby(level=[0,1])}
+
+def day_rows(df):
+    # rows sorted by (academic year, term, cohort), keeping file order inside each group
+    # like groupby does, so they line up with the groups of the cube
+    keep = df.index.to_frame(index=False).notna().all(axis=1).to_numpy()
+    return to_baht(df[keep].sort_index(kind='mergesort')).values.tolist()
+
+def to_baht(df):
+    # money is kept as integer satang until it is written to the workbook
+    return df.assign(**{c: df[c] / 100 for c in report_money_columns if c in df.columns})
+
 def write_summary_report(wb, dfs):
-    df = pd.concat(dfs)
-    df = df[['รายได้คณะ', 'กองทุนคณะ.1', 'รายได้คณะ.2', 'dep_income', 'รวม']]
+    write_summary_tables(wb, summary_tables(aggregate_cube(dfs)))
 
-    for academic_term, d in df.groupby(level=[0,1]):
-        # calculate summary
-        ov = d.groupby(level=2).agg(sum)
-        ov['count'] = d.groupby(level=2).size()
-        ov = ov[['count', 'รวม', 'รายได้คณะ', 'กองทุนคณะ.1', 'รายได้คณะ.2', 'dep_income']]
+def write_summary_tables(wb, tables):
+    for academic_term, ov in tables.items():
+        total = to_baht(ov.sum().to_frame().T).iloc[0]
+        ov = to_baht(ov)
 
         # write to excel 
         ws = wb.create_sheet("overview_{}_{}".format(*academic_term))
@@ -129,7 +933,7 @@ def write_summary_report(wb, dfs):
 
         for i, row in ov.iterrows():
             ws.append([i] + row.tolist())
-        ws.append(['รวมทั้งสิ้น'] + ov.sum().tolist())
+        ws.append(['รวมทั้งสิ้น'] + total.tolist())
 
         for row in ws[f'C3:G{3+len(ov)}']:
             for cell in row:
@@ -147,11 +951,11 @@ def write_summary_report(wb, dfs):
             for cell in row:
                 cell.border = thin_border
 
-def write_overall_report(wb, total_stats, month):
+def write_overall_report(wb, total_stats, month, title=program_title[program_code['DSI']]):
     # group data together
     data = {}
     for k, v in total_stats:
-        data[k] = data.setdefault(k, []) + [v]
+        data.setdefault(k, []).append(v)
 
     for k, v in data.items():
         ws = wb.create_sheet(month_name[month[0][0]-1] + f"_{k[0]}_{k[1]}")
@@ -172,7 +976,7 @@ def write_overall_report(wb, total_stats, month):
 
         ws.merge_cells('A2:F2')  
         cell = ws.cell(row=2, column=1)
-        cell.value = 'หลักสูตรวิทยาศาสตรบัณฑิต สาขาวิชาวิทยาศาสตร์และนวัตกรรมข้อมูล'
+        cell.value = title
 
         ws.append([None, '18\r\nค่าหน่วยกิต', '01\nค่าธรรมเนียมเพื่อการศึกษาและพัฒนามหาวิทยาลัย', '31 / 98\nค่าธรรมเนียมพิเศษ (อื่นๆ)', None, None])
         ws.append([None, 'รายได้คณะ', 'กองทุนคณะ', 'รายได้คณะ', 'รวม\nรายได้คณะ', 'รวม\nค่าลงทะเบียน'])
@@ -244,9 +1048,39 @@ def write_overall_report(wb, total_stats, month):
                 cell.border = thin_border
 
 
-def write_oneday_report(df, wb, date):
+def write_duplicates_report(wb, conflicts):
+    ws = wb.create_sheet("duplicates")
+
+    widths = [12, 30, 14, 14, 25, 10, 6, 14, 8, 12]
+    for i, w in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = w
+
+    ws.append(['วันที่', 'ไฟล์', 'เลขที่ใบเสร็จ', 'เลขทะเบียน', 'ชื่อ นามสกุล', 'ปีการศึกษา', 'ภาค', 'รวม', 'สถานะ', 'ยอดไม่ตรงกัน'])
+    for cell in ws["1:1"]:
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal="center")
+        cell.border = thin_border
+
+    for r in conflicts.to_dict('records'):
+        ws.append([r['date'].strftime("%d/%m/") + str(r['date'].year+543), r['source'], r['เลขที่ใบเสร็จ'], 
+                   r['เลขทะเบียน'], r['ชื่อ นามสกุล'], r['ปีการศึกษา'], r['ภาค'], r['รวม'] / 100,
+                   'ซ้ำ' if r['repeat'] else 'นับ', 'ใช่' if r['mismatch'] else ''])
+
+    for row in ws[f'A2:J{len(conflicts)+1}']:
+        for cell in row:
+            cell.border = thin_border
+    for row in ws[f'H2:H{len(conflicts)+1}']:
+        for cell in row:
+            cell.number_format = '_-* #,##0.00_-;-* #,##0.00_-;_-* "-"??_-;_-@_-'
+
+def write_oneday_report(df, wb, date, title=program_title[program_code['DSI']], agg=None):
+    if agg is None:
+        agg = split_cube(aggregate_cube([df]), 1)[0]
     total_stat = []
-    for d, new_df in df.groupby(level=[0,1]):
+    rows = day_rows(df)
+    pos = 0
+    for d, sub in agg.groupby(level=[0,1]):
+        sub = sub.droplevel([0,1])
         ws = wb.create_sheet(date.strftime("%d%m%Y"))
         
         # set header
@@ -263,7 +1097,7 @@ def write_oneday_report(df, wb, date):
         
         ws.merge_cells('A2:L2')  
         cell = ws.cell(row=2, column=1)
-        cell.value = 'หลักสูตรวิทยาศาสตรบัณฑิต สาขาวิชาวิทยาศาสตร์และนวัตกรรมข้อมูล'
+        cell.value = title
         
         ws.append([None, None, None, None, None, None, None, '18\r\nค่าหน่วยกิต', '01\nค่าธรรมเนียมเพื่อการศึกษาและพัฒนามหาวิทยาลัย', '31 / 98\nค่าธรรมเนียมพิเศษ (อื่นๆ)', None, None])
         ws.append(['วิทยาเขต', 'คณะ', 'เลขทะเบียน', 'เลขที่ใบเสร็จ', 'ชื่อ นามสกุล', 'ปีการศึกษา', 'ภาค', 'รายได้คณะ', 'กองทุนคณะ', 'รายได้คณะ', 'รวม\nรายได้คณะ', 'รวม\nค่าลงทะเบียน'])
@@ -305,22 +1139,22 @@ def write_oneday_report(df, wb, date):
 
         # write rows
         row_no = 4
-        for ind, df_code in new_df.groupby(level=2):
-            for i, r in enumerate(dataframe_to_rows(df_code, index=False, header=False)):
+        for ind, count, res in zip(sub.index, sub['count'], (sub[report_money_columns] / 100).values.tolist()):
+            for i, r in enumerate(rows[pos:pos+count]):
                 ws.append(r[:5] + [*d] + r[5:])
                 for cell in ws[f"{row_no+i+1}:{row_no+i+1}"]:
                     cell.font = Font(bold=False)
                     cell.border = thin_border
                 for cell in ws[f"H{row_no+i+1}:L{row_no+i+1}"][0]:
                     cell.alignment = Alignment(horizontal="right")
+            pos += count
             
-            res = df_code.agg('sum').tolist()
-            ws.append([None]*7 + res[5:])
+            ws.append([None]*7 + res)
             
-            row_no = row_no + len(df_code) + 1
+            row_no = row_no + count + 1
             ws.merge_cells(f'A{row_no}:G{row_no}')  
             cell = ws.cell(row=row_no, column=1)
-            cell.value = f'รหัส {ind} จำนวน {len(df_code)} คน'
+            cell.value = f'รหัส {ind} จำนวน {count} คน'
             cell.alignment = Alignment(horizontal="center")
             
             for cell in ws[f"{row_no}:{row_no}"]:
@@ -329,20 +1163,21 @@ def write_oneday_report(df, wb, date):
             for cell in ws[f"H{row_no}:L{row_no}"][0]:
                 cell.alignment = Alignment(horizontal="right")
 
-        res = new_df.agg('sum').tolist()
-        ws.append([None]*7 + res[5:])
+        res = (sub[report_money_columns].sum() / 100).tolist()
+        total = int(sub['count'].sum())
+        ws.append([None]*7 + res)
         
         row_no = row_no + 1
         ws.merge_cells(f'A{row_no}:G{row_no}')
         cell = ws.cell(row=row_no, column=1)
         
-        code_list = new_df.index.unique(level=2)
+        code_list = sub.index
         if len(code_list) > 1:
             code_str = ", ".join(code_list[:-1]) + ' และ ' + code_list[-1]
         else:
             code_str = code_list[0]
             
-        cell.value = f'รวม {code_str} จำนวน {len(new_df)} คน'
+        cell.value = f'รวม {code_str} จำนวน {total} คน'
         cell.alignment = Alignment(horizontal="center")
         
         for cell in ws[f"{row_no}:{row_no}"]:
@@ -354,10 +1189,208 @@ def write_oneday_report(df, wb, date):
                 cell.number_format = '_-* #,##0.00_-;-* #,##0.00_-;_-* "-"??_-;_-@_-'
         
         # get total stats for overall report
+        total_list = [f'ยอดรวมรหัส {ind} จำนวนนศ. {count} คน' for ind, count in zip(sub.index, sub['count'])]
+        total_stat.append((d, [total_list, total, date, res]))
+    return total_stat
+
+# faster writer backend: same layout as the writers above, but every cell gets a 
+# named style registered once per workbook instead of fresh style objects
+accounting_format = '_-* #,##0.00_-;-* #,##0.00_-;_-* "-"??_-;_-@_-'
+top_border = Border(left=Side(style='thin'), 
+                    right=Side(style='thin'), 
+                    top=Side(style='thin'))
+bottom_border = Border(left=Side(style='thin'), 
+                       right=Side(style='thin'), 
+                       bottom=Side(style='thin'))
+wrap_center = Alignment(horizontal="center", vertical="center", wrapText=True)
+
+def _fill(color):
+    return PatternFill(patternType='solid', fgColor=color)
+
+named_style_specs = {
+    'ir_top': dict(border=top_border),
+    'ir_head': dict(font=Font(bold=True), alignment=Alignment(horizontal="center"), border=bottom_border),
+    'ir_head_middle': dict(font=Font(bold=True), alignment=Alignment(horizontal="center", vertical="center"), 
+                           border=top_border),
+    'ir_fee_credit': dict(font=Font(bold=True), alignment=wrap_center, fill=_fill("FFFF00"), border=thin_border),
+    'ir_fee_fund': dict(font=Font(bold=True), alignment=wrap_center, fill=_fill("E2EFDA"), border=thin_border),
+    'ir_fee_special': dict(font=Font(bold=True), alignment=wrap_center, fill=_fill("FFF2CC"), border=thin_border),
+    'ir_dep_top': dict(alignment=wrap_center, fill=_fill("92D050"), border=top_border),
+    'ir_dep_bottom': dict(font=Font(bold=True), alignment=wrap_center, fill=_fill("92D050"), border=bottom_border),
+    'ir_total_top': dict(font=Font(color="FFFFFF", bold=True), alignment=wrap_center, fill=_fill("8EA9DB"), 
+                         border=top_border),
+    'ir_total_bottom': dict(font=Font(color="FFFFFF", bold=True), alignment=wrap_center, fill=_fill("8EA9DB"), 
+                            border=bottom_border),
+    'ir_cell': dict(font=Font(bold=False), border=thin_border),
+    'ir_money': dict(font=Font(bold=False), border=thin_border, alignment=Alignment(horizontal="right"), 
+                     number_format=accounting_format),
+    'ir_sub_label': dict(font=Font(bold=True), border=double_border, alignment=Alignment(horizontal="center")),
+    'ir_sub': dict(font=Font(bold=True), border=double_border),
+    'ir_sub_money': dict(font=Font(bold=True), border=double_border, alignment=Alignment(horizontal="right"), 
+                         number_format=accounting_format),
+    'ir_sum_money': dict(font=Font(bold=True), border=double_border, number_format=accounting_format),
+    'ir_box': dict(border=thin_border),
+    'ir_box_bold': dict(font=Font(bold=True), border=thin_border),
+    'ir_box_head': dict(font=Font(bold=True), alignment=Alignment(horizontal="center", vertical="center"), 
+                        border=thin_border),
+    'ir_box_money': dict(border=thin_border, number_format=accounting_format),
+    'ir_box_money_bold': dict(font=Font(bold=True), border=thin_border, number_format=accounting_format),
+    'ir_wrap_box': dict(alignment=Alignment(wrap_text=True), border=thin_border),
+    'ir_wrap_box_bold': dict(font=Font(bold=True), alignment=Alignment(wrap_text=True), border=thin_border),
+}
+
+fee_header_top = ['ir_fee_credit', 'ir_fee_fund', 'ir_fee_special', 'ir_dep_top', 'ir_total_top']
+fee_header_bottom = ['ir_fee_credit', 'ir_fee_fund', 'ir_fee_special', 'ir_dep_bottom', 'ir_total_bottom']
+
+def add_named_styles(wb):
+    if 'ir_top' in wb.named_styles:
+        return
+    for name, spec in named_style_specs.items():
+        # cells without an explicit font keep the workbook default font
+        spec = dict(spec, font=spec.get('font', DEFAULT_FONT))
+        wb.add_named_style(NamedStyle(name=name, **spec))
+
+def _style_row(ws, row, styles, values=None):
+    values = values or [None] * len(styles)
+    for col, (value, style) in enumerate(zip(values, styles), 1):
+        ws.cell(row=row, column=col, value=value).style = style
+
+def write_summary_report_fast(wb, dfs):
+    write_summary_tables_fast(wb, summary_tables(aggregate_cube(dfs)))
+
+def write_summary_tables_fast(wb, tables):
+    add_named_styles(wb)
+    for academic_term, ov in tables.items():
+        total = to_baht(ov.sum().to_frame().T).iloc[0]
+        ov = to_baht(ov)
+
+        # write to excel 
+        ws = wb.create_sheet("overview_{}_{}".format(*academic_term))
+        for i in range(1,8):
+            ws.column_dimensions[get_column_letter(i)].width = 15
+
+        ws.append([None, None, None, None, None, None, None])
+        ws.append([None, None, None, 'ค่าหน่วยกิต', 'ค่าธรรมเนียมพิเศษ', 'ค่าธรรมเนียมเพื่อการศึกษาฯ', 'รวมเงินโอนเข้าคณะ'])
+        ws.merge_cells('D1:G1')
+        ws.cell(row=1, column=4).value = 'รายได้คณะ'
+        for i, t in enumerate(['รหัส', 'จำนวน น.ศ. (คน)', 'ค่าลงทะเบียน (บาท)']):
+            row = chr(i + ord('A'))
+            ws.merge_cells(f'{row}1:{row}2')
+            ws.cell(row=1, column=i+1).value = t
+        _style_row(ws, 1, ['ir_box_head'] * 4 + ['ir_box'] * 3)
+        _style_row(ws, 2, ['ir_box'] * 3 + ['ir_box_bold'] * 4)
+
+        row_no = 2
+        for i, row in zip(ov.index, ov.values.tolist()):
+            row_no += 1
+            _style_row(ws, row_no, ['ir_box'] * 2 + ['ir_box_money'] * 5, [i] + row)
+        _style_row(ws, row_no + 1, ['ir_box_bold'] * 2 + ['ir_box_money_bold'] * 5, 
+                   ['รวมทั้งสิ้น'] + total.tolist())
+
+def write_overall_report_fast(wb, total_stats, month, title=program_title[program_code['DSI']]):
+    add_named_styles(wb)
+    # group data together
+    data = {}
+    for k, v in total_stats:
+        data.setdefault(k, []).append(v)
+
+    for k, v in data.items():
+        ws = wb.create_sheet(month_name[month[0][0]-1] + f"_{k[0]}_{k[1]}")
+
+        widths = [50, 15, 15, 15, 15, 15]
+        for i, w in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(i)].width = w
+        ws.row_dimensions[3].height = 90
+        ws.row_dimensions[4].height = 60
+
+        year = k[0]
+        sem = k[1]
+
+        ws.merge_cells('A1:F1')
+        ws.cell(row=1, column=1).value = f'รายรับค่าจดทะเบียน {sem}/{year} ประจำเดือน {month_name[month[0][0]-1]} {month[0][1]+543}'
+        ws.merge_cells('A2:F2')  
+        ws.cell(row=2, column=1).value = title
+
+        ws.append([None, '18\r\nค่าหน่วยกิต', '01\nค่าธรรมเนียมเพื่อการศึกษาและพัฒนามหาวิทยาลัย', '31 / 98\nค่าธรรมเนียมพิเศษ (อื่นๆ)', None, None])
+        ws.append([None, 'รายได้คณะ', 'กองทุนคณะ', 'รายได้คณะ', 'รวม\nรายได้คณะ', 'รวม\nค่าลงทะเบียน'])
+        ws.merge_cells('A3:A4')
+        ws.cell(row=3, column=1).value = 'รวมจำนวนนักศึกษาของแต่ละวัน'
+        _style_row(ws, 3, ['ir_head_middle'] + fee_header_top)
+        _style_row(ws, 4, ['ir_head'] + fee_header_bottom)
+
+        n = len(v)+4
+        for row_no, (total_list, total, date, res) in enumerate(v, 5):
+            if len(total_list) == 1:
+                total_str = total_list[0]
+            else:
+                total_detail = ", ".join(total_list[:-1]) + " และ " + total_list[-1] + "\n"
+                total_str = total_detail + f"(รวมนศ.ทั้งหมด จำนวน {total} คน)"
+            label = total_str + "              วันที่ " + date.strftime("%d/%#m/") + str(date.year+543)
+            _style_row(ws, row_no, ['ir_wrap_box'] + ['ir_box_money'] * 5, [label] + res)
+        _style_row(ws, n+1, ['ir_wrap_box_bold'] + ['ir_box_money_bold'] * 5, 
+                   ["รวม", f"=SUM(B5:B{n})", f"=SUM(C5:C{n})", f"=SUM(D5:D{n})", f"=SUM(E5:E{n})", f"=SUM(F5:F{n})"])
+
+def write_oneday_report_fast(df, wb, date, title=program_title[program_code['DSI']], agg=None):
+    add_named_styles(wb)
+    if agg is None:
+        agg = split_cube(aggregate_cube([df]), 1)[0]
+    total_stat = []
+    rows = day_rows(df)
+    pos = 0
+    for d, sub in agg.groupby(level=[0,1]):
+        sub = sub.droplevel([0,1])
+        ws = wb.create_sheet(date.strftime("%d%m%Y"))
+        
+        # set header
+        widths = [8, 12, 10, 10, 18, 7, 5, 10, 10, 10, 10, 10]
+        for i, w in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(i)].width = w
+        ws.row_dimensions[3].height = 90
+        ws.row_dimensions[4].height = 60
+        
+        ws.merge_cells('A1:L1')
+        ws.cell(row=1, column=1).value = f'รายรับค่าจดทะเบียน {d[1]}/{d[0]} ณ วันที่ {date.day} {month_name[date.month-1]} {date.year+543}'
+        ws.merge_cells('A2:L2')  
+        ws.cell(row=2, column=1).value = title
+        
+        ws.append([None, None, None, None, None, None, None, '18\r\nค่าหน่วยกิต', '01\nค่าธรรมเนียมเพื่อการศึกษาและพัฒนามหาวิทยาลัย', '31 / 98\nค่าธรรมเนียมพิเศษ (อื่นๆ)', None, None])
+        ws.append(['วิทยาเขต', 'คณะ', 'เลขทะเบียน', 'เลขที่ใบเสร็จ', 'ชื่อ นามสกุล', 'ปีการศึกษา', 'ภาค', 'รายได้คณะ', 'กองทุนคณะ', 'รายได้คณะ', 'รวม\nรายได้คณะ', 'รวม\nค่าลงทะเบียน'])
+        _style_row(ws, 3, ['ir_top'] * 7 + fee_header_top)
+        _style_row(ws, 4, ['ir_head'] * 7 + fee_header_bottom)
+
+        # write rows
+        row_no = 4
         total_list = []
-        total = 0
-        for ind, df_code in new_df.groupby(level=2):
-            total_list.append(f'ยอดรวมรหัส {ind} จำนวนนศ. {len(df_code)} คน')
-            total += len(df_code)
-        total_stat.append((d, [total_list, total, date, res[5:]]))
-    return total_stat
\ No newline at end of file
+        for ind, count, res in zip(sub.index, sub['count'], (sub[report_money_columns] / 100).values.tolist()):
+            for r in rows[pos:pos+count]:
+                row_no += 1
+                _style_row(ws, row_no, ['ir_cell'] * 7 + ['ir_money'] * 5, r[:5] + [*d] + r[5:])
+            pos += count
+            
+            row_no += 1
+            ws.merge_cells(f'A{row_no}:G{row_no}')  
+            _style_row(ws, row_no, ['ir_sub_label'] + ['ir_sub'] * 6 + ['ir_sub_money'] * 5, 
+                       [f'รหัส {ind} จำนวน {count} คน'] + [None] * 6 + res)
+            total_list.append(f'ยอดรวมรหัส {ind} จำนวนนศ. {count} คน')
+
+        code_list = sub.index
+        if len(code_list) > 1:
+            code_str = ", ".join(code_list[:-1]) + ' และ ' + code_list[-1]
+        else:
+            code_str = code_list[0]
+
+        row_no += 1
+        res = (sub[report_money_columns].sum() / 100).tolist()
+        total = int(sub['count'].sum())
+        ws.merge_cells(f'A{row_no}:G{row_no}')
+        _style_row(ws, row_no, ['ir_sub_label'] + ['ir_sub'] * 6 + ['ir_sum_money'] * 5, 
+                   [f'รวม {code_str} จำนวน {total} คน'] + [None] * 6 + res)
+        
+        # get total stats for overall report
+        total_stat.append((d, [total_list, total, date, res]))
+    return total_stat
+
+report_writers = {
+    'reference': (write_oneday_report, write_summary_tables, write_overall_report),
+    'fast': (write_oneday_report_fast, write_summary_tables_fast, write_overall_report_fast),
+}